@@ -45,11 +45,13 @@ def load_correlation_ids(header_key: str = 'CORRELATION_ID', generator: Callable
         id_value = task.request.get(header_key)
         if id_value:
             correlation_id.set(id_value)
-            sentry_extension(id_value)
+            if sentry_extension:
+                sentry_extension(id_value)
         else:
             generated_correlation_id = generator()
             correlation_id.set(generated_correlation_id)
-            sentry_extension(generated_correlation_id)
+            if sentry_extension:
+                sentry_extension(generated_correlation_id)
 
     @task_postrun.connect(weak=False)
     def cleanup(**kwargs: Any) -> None:
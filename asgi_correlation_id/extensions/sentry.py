@@ -1,9 +1,11 @@
-from typing import Callable
+from typing import Callable, Optional
 
 
-def get_sentry_extension() -> Callable[[str], None]:
+def get_sentry_extension() -> Optional[Callable[[str], None]]:
     """
     Return set_transaction_id, if the Sentry-sdk is installed.
+
+    Returns None otherwise, so callers can skip the call entirely.
     """
     try:
         import sentry_sdk  # noqa: F401, TC002
@@ -12,7 +14,7 @@ def get_sentry_extension() -> Callable[[str], None]:
 
         return set_transaction_id
     except ImportError:  # pragma: no cover
-        return lambda correlation_id: None
+        return None
 
 
 def set_transaction_id(correlation_id: str) -> None:
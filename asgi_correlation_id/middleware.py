@@ -1,9 +1,9 @@
 import logging
+import os
+import threading
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING, Callable, Optional
-from uuid import UUID, uuid4
-
-from starlette.datastructures import MutableHeaders
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple
 
 from asgi_correlation_id.context import correlation_id
 from asgi_correlation_id.extensions.sentry import get_sentry_extension
@@ -12,21 +12,118 @@ if TYPE_CHECKING:
     from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 logger = logging.getLogger('asgi_correlation_id')
+_log_warning = logger.warning
+
+
+_HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
 
 
 def is_valid_uuid4(uuid_: str) -> bool:
     """
     Check whether a string is a valid v4 uuid.
+
+    Accepts the 32-character hex form and the 36-character hyphenated form.
+    The check is done on the string directly, to avoid constructing a UUID
+    object (and raising an exception) on every request.
     """
-    try:
-        return bool(UUID(uuid_, version=4))
-    except ValueError:
+    if len(uuid_) == 36:
+        if uuid_[8] != '-' or uuid_[13] != '-' or uuid_[18] != '-' or uuid_[23] != '-':
+            return False
+        uuid_ = uuid_.replace('-', '')
+    if len(uuid_) != 32:
         return False
+    # Like UUID(uuid_, version=4), any hex value is accepted, since the version bits would be overwritten anyway
+    return _HEX_DIGITS.issuperset(uuid_)
+
+
+class _EntropyCache(threading.local):
+    """
+    Per-thread buffer of random bytes, so generating an ID doesn't need a syscall every time.
+    """
+
+    buffer = b''
+    position = 0
+
+
+_ENTROPY_CACHE_SIZE = 2048
+_entropy = _EntropyCache()
+
+
+def _reset_entropy() -> None:
+    """
+    Drop cached entropy, so forked processes never hand out the same IDs as their parent.
+    """
+    global _entropy
+    _entropy = _EntropyCache()
+
+
+if hasattr(os, 'register_at_fork'):  # pragma: no branch
+    os.register_at_fork(after_in_child=_reset_entropy)
+
+
+def _default_generator() -> str:
+    """
+    Generate a random v4 uuid as a 32-character hex string.
+
+    Equivalent to uuid4().hex, without building the intermediate UUID object,
+    and drawing randomness from os.urandom in 2 KiB batches.
+    """
+    entropy = _entropy
+    position = entropy.position
+    if position + 16 > len(entropy.buffer):
+        entropy.buffer = os.urandom(_ENTROPY_CACHE_SIZE)
+        position = 0
+    entropy.position = position + 16
+    b = bytearray(entropy.buffer[position : position + 16])
+    b[6] = (b[6] & 0x0F) | 0x40  # version 4
+    b[8] = (b[8] & 0x3F) | 0x80  # RFC 4122 variant
+    return b.hex()
+
+
+@lru_cache(maxsize=None)
+def _load_extensions() -> Optional[Callable[[str], None]]:
+    """
+    Load extensions once per process, and return the Sentry extension if available.
+
+    Connecting the Celery signal handlers more than once would make every
+    task run them several times, so later middleware instances reuse the
+    result of the first call.
+    """
+    try:
+        import celery  # noqa: F401, TC002
+
+        from asgi_correlation_id.extensions.celery import load_correlation_ids
+
+        load_correlation_ids()
+    except ImportError:  # pragma: no cover
+        pass
+    return get_sentry_extension()
 
 
 FAILED_VALIDATION_MESSAGE = 'Generated new request ID (%s), since request header value failed validation'
 
 
+class _ResponseHeaderSender:
+    """
+    Wrap an ASGI send callable, to add the correlation ID header to HTTP responses.
+    """
+
+    __slots__ = ('send', 'header_name')
+
+    def __init__(self, send: 'Send', header_name: bytes) -> None:
+        self.send = send
+        self.header_name = header_name
+
+    async def __call__(self, message: 'Message') -> None:
+        if message['type'] == 'http.response.start':
+            cid = correlation_id.get()
+            if cid:
+                # Build a new list, since apps may reuse their header list (e.g. a mounted Response) across requests
+                message['headers'] = [*message.get('headers', ()), (self.header_name, cid.encode('latin-1'))]
+
+        await self.send(message)
+
+
 @dataclass
 class CorrelationIdMiddleware:
     app: 'ASGIApp'
@@ -34,61 +131,91 @@ class CorrelationIdMiddleware:
     update_request_header: bool = True
 
     # ID-generating callable
-    generator: Callable[[], str] = field(default=lambda: uuid4().hex)
+    generator: Callable[[], str] = field(default=_default_generator)
 
     # ID validator
     validator: Optional[Callable[[str], bool]] = field(default=is_valid_uuid4)
 
     # ID transformer - can be used to clean/mutate IDs
-    transformer: Optional[Callable[[str], str]] = field(default=lambda a: a)
+    transformer: Optional[Callable[[str], str]] = None
 
     async def __call__(self, scope: 'Scope', receive: 'Receive', send: 'Send') -> None:
+        """
+        Dispatch on scope type. Other scopes, like lifespan, go straight to the app.
+        """
+        await self._handlers.get(scope['type'], self.app)(scope, receive, send)
+
+    async def _handle_request(self, scope: 'Scope', receive: 'Receive', send: 'Send') -> None:
         """
         Load request ID from headers if present. Generate one otherwise.
         """
-        if scope['type'] not in ('http', 'websocket'):
-            await self.app(scope, receive, send)
-            return
+        # Bind attributes used more than once per request to locals
+        transformer = self.transformer
 
         # Try to load request ID from the request headers
-        headers = MutableHeaders(scope=scope)
-        header_value = headers.get(self.header_name.lower())
+        header_name = self._header_name_bytes
+        header_value = None
+        header_indexes = []
+        for index, (name, value) in enumerate(scope['headers']):
+            if name == header_name:
+                if header_value is None:
+                    header_value = value.decode('latin-1')
+                header_indexes.append(index)
 
-        validation_failed = False
-        if not header_value:
-            # Generate request ID if none was found
-            id_value = self.generator()
-        elif self.validator and not self.validator(header_value):
-            # Also generate a request ID if one was found, but it was deemed invalid
-            validation_failed = True
-            id_value = self.generator()
-        else:
-            # Otherwise, use the found request ID
-            id_value = header_value
+        id_value, validation_failed = self._resolve_id(header_value)
 
         # Clean/change the ID if needed
-        if self.transformer:
-            id_value = self.transformer(id_value)
+        if transformer:
+            id_value = transformer(id_value)
 
         if validation_failed is True:
-            logger.warning(FAILED_VALIDATION_MESSAGE, id_value)
+            _log_warning(FAILED_VALIDATION_MESSAGE, id_value)
 
         # Update the request headers if needed
         if id_value != header_value and self.update_request_header is True:
-            headers[self.header_name] = id_value
-
-        correlation_id.set(id_value)
-        self.sentry_extension(id_value)
-
-        async def handle_outgoing_request(message: 'Message') -> None:
-            if message['type'] == 'http.response.start' and correlation_id.get():
-                headers = MutableHeaders(scope=message)
-                headers.append(self.header_name, correlation_id.get())
+            # Replace the first matching header and drop any duplicates, so the rejected value can't leak through
+            headers = scope['headers'] = list(scope['headers'])
+            header = (header_name, id_value.encode('latin-1'))
+            if header_indexes:
+                for index in reversed(header_indexes[1:]):
+                    del headers[index]
+                headers[header_indexes[0]] = header
+            else:
+                headers.append(header)
+
+        # An outer middleware may already have set the same ID, in which case there is nothing to write
+        if correlation_id.get() != id_value:
+            correlation_id.set(id_value)
+        if self.sentry_extension:
+            self.sentry_extension(id_value)
+
+        # Only HTTP responses carry the header, so websocket connections keep the original send
+        if scope['type'] == 'http':
+            send = _ResponseHeaderSender(send, self._header_name_bytes)
+
+        await self.app(scope, receive, send)
+        return
 
-            await send(message)
+    def _resolve_id_with_validator(self, header_value: Optional[str]) -> Tuple[str, bool]:
+        """
+        Return the request ID to use, and whether the header value failed validation.
+        """
+        if not header_value:
+            # Generate request ID if none was found
+            return self.generator(), False
+        if not self.validator(header_value):  # type: ignore[misc]  # only selected when a validator is set
+            # Also generate a request ID if one was found, but it was deemed invalid
+            return self.generator(), True
+        # Otherwise, use the found request ID
+        return header_value, False
 
-        await self.app(scope, receive, handle_outgoing_request)
-        return
+    def _resolve_id_without_validator(self, header_value: Optional[str]) -> Tuple[str, bool]:
+        """
+        Return the request ID to use, accepting any non-empty header value.
+        """
+        if not header_value:
+            return self.generator(), False
+        return header_value, False
 
     def __post_init__(self) -> None:
         """
@@ -97,12 +224,11 @@ class CorrelationIdMiddleware:
         If Sentry is installed, propagate correlation IDs to Sentry events.
         If Celery is installed, propagate correlation IDs to spawned worker processes.
         """
-        self.sentry_extension = get_sentry_extension()
-        try:
-            import celery  # noqa: F401, TC002
-
-            from asgi_correlation_id.extensions.celery import load_correlation_ids
-
-            load_correlation_ids()
-        except ImportError:  # pragma: no cover
-            pass
+        # ASGI header names are lower-cased bytes, so we only need to compute this once
+        self._header_name_bytes = self.header_name.lower().encode('latin-1')
+        # Pick the ID resolver once, so requests don't have to check for a validator
+        self._resolve_id = (
+            self._resolve_id_with_validator if self.validator else self._resolve_id_without_validator
+        )
+        self.sentry_extension = _load_extensions()
+        self._handlers: Dict[str, 'ASGIApp'] = {'http': self._handle_request, 'websocket': self._handle_request}
@@ -0,0 +1,59 @@
+import os
+from uuid import UUID, uuid1, uuid4
+
+import pytest
+
+from asgi_correlation_id.middleware import _default_generator, is_valid_uuid4
+
+
+@pytest.mark.parametrize(
+    ('value', 'expected'),
+    [
+        (uuid4().hex, True),
+        (str(uuid4()), True),
+        (str(uuid4()).upper(), True),
+        (uuid1().hex, True),
+        ('01890a5d-ac96-774b-bcce-b302099a8057', True),
+        (uuid4().hex[:12] + '4' + uuid4().hex[13:16] + 'c' + uuid4().hex[17:], True),
+        (str(uuid4()).replace('-', '', 1) + '-', False),
+        ('x' + uuid4().hex[1:], False),
+        ('', False),
+    ],
+)
+def test_is_valid_uuid4(value, expected):
+    assert is_valid_uuid4(value) is expected
+
+
+def test_default_generator():
+    # Enough values to run through the entropy cache more than once
+    values = {_default_generator() for _ in range(300)}
+    assert len(values) == 300
+    for value in values:
+        assert len(value) == 32
+        assert UUID(value).version == 4
+        assert is_valid_uuid4(value)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork')
+def test_default_generator_after_fork():
+    """
+    A forked process must not reuse the entropy cached by its parent.
+    """
+    _default_generator()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        # Never return into pytest from the child, whatever happens
+        exit_code = 1
+        try:
+            os.write(write_fd, _default_generator().encode())
+            exit_code = 0
+        finally:
+            os._exit(exit_code)
+    # Close our end of the pipe first, so the read gets EOF if the child dies before writing
+    os.close(write_fd)
+    _, status = os.waitpid(pid, 0)
+    child_value = os.read(read_fd, 32).decode()
+    os.close(read_fd)
+    assert status == 0
+    assert child_value != _default_generator()
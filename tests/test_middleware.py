@@ -5,9 +5,16 @@ from uuid import uuid4
 import pytest
 from fastapi import Request, Response
 from httpx import AsyncClient
+from starlette.responses import PlainTextResponse
 from starlette.testclient import TestClient
 
-from asgi_correlation_id.middleware import FAILED_VALIDATION_MESSAGE, is_valid_uuid4
+from asgi_correlation_id.context import correlation_id
+from asgi_correlation_id.middleware import (
+    FAILED_VALIDATION_MESSAGE,
+    CorrelationIdMiddleware,
+    _load_extensions,
+    is_valid_uuid4,
+)
 from tests.conftest import (
     TRANSFORMER_VALUE,
     default_app,
@@ -152,6 +159,116 @@ async def test_multiple_headers_same_name(caplog, app):
         assert response.headers['set-cookie'].find('refresh_token_cookie') != -1
 
 
+@pytest.mark.parametrize('headers', [None, (), ((b'content-type', b'text/plain'),)])
+async def test_raw_response_headers(headers):
+    """
+    The response header should be added regardless of how the app passes its headers.
+    """
+
+    async def raw_app(scope, receive, send):
+        message = {'type': 'http.response.start', 'status': 200}
+        if headers is not None:
+            message['headers'] = headers
+        await send(message)
+        await send({'type': 'http.response.body', 'body': b''})
+
+    cid = uuid4().hex
+    async with AsyncClient(app=CorrelationIdMiddleware(raw_app), base_url='http://test') as client:
+        response = await client.get('test', headers={'X-Request-ID': cid})
+        assert response.headers['X-Request-ID'] == cid
+
+
+async def test_reused_response():
+    """
+    A response object reused across requests must not accumulate correlation IDs.
+    """
+    app = CorrelationIdMiddleware(PlainTextResponse('ok'))
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        for _ in range(2):
+            cid = uuid4().hex
+            response = await client.get('test', headers={'X-Request-ID': cid})
+            assert response.headers.get_list('X-Request-ID') == [cid]
+
+
+async def test_duplicate_invalid_request_headers():
+    """
+    Every copy of a rejected request header should be replaced by the new ID.
+    """
+    seen = []
+
+    async def raw_app(scope, receive, send):
+        seen.extend(value for name, value in scope['headers'] if name == b'x-request-id')
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    headers = [(b'x-request-id', b'bad'), (b'x-request-id', b'bad2')]
+    async with AsyncClient(app=CorrelationIdMiddleware(raw_app), base_url='http://test') as client:
+        response = await client.get('test', headers=headers)
+        assert seen == [response.headers['X-Request-ID'].encode()]
+
+
+async def test_custom_header_name():
+    """
+    Header names should be matched case-insensitively, both when reading and echoing the ID.
+    """
+
+    async def raw_app(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    cid = uuid4().hex
+    app = CorrelationIdMiddleware(raw_app, header_name='X-Correlation-ID')
+    async with AsyncClient(app=app, base_url='http://test') as client:
+        response = await client.get('test', headers={'x-correlation-id': cid})
+        assert response.headers['X-Correlation-ID'] == cid
+
+
+async def test_lifespan_passthrough():
+    """
+    Lifespan events should be passed straight through to the app.
+    """
+    calls = []
+
+    async def raw_app(scope, receive, send):
+        calls.append((scope, receive, send))
+
+    async def receive():
+        pass
+
+    async def send(message):
+        pass
+
+    scope = {'type': 'lifespan'}
+    await CorrelationIdMiddleware(raw_app)(scope, receive, send)
+    assert calls == [(scope, receive, send)]
+
+
+async def test_nested_middleware(mocker):
+    """
+    An inner middleware shouldn't set the correlation ID again when the outer one already set the same value.
+    """
+    context_mock = mocker.patch('asgi_correlation_id.middleware.correlation_id', wraps=correlation_id)
+
+    async def raw_app(scope, receive, send):
+        pass
+
+    cid = uuid4().hex
+    scope = {'type': 'http', 'headers': [(b'x-request-id', cid.encode())]}
+    await CorrelationIdMiddleware(CorrelationIdMiddleware(raw_app))(scope, None, None)
+    context_mock.set.assert_called_once_with(cid)
+
+
+async def test_extensions_loaded_once(mocker):
+    """
+    Celery signal handlers should only be connected once, however many middleware instances are created.
+    """
+    load_mock = mocker.patch('asgi_correlation_id.extensions.celery.load_correlation_ids')
+    _load_extensions.cache_clear()
+    CorrelationIdMiddleware(default_app)
+    CorrelationIdMiddleware(default_app)
+    load_mock.assert_called_once_with()
+
+
 async def test_no_validator():
     async with AsyncClient(app=no_validator_or_transformer_app, base_url='http://test') as client:
         response = await client.get('test', headers={'X-Request-ID': 'bad-uuid'})